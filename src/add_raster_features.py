@@ -4,16 +4,59 @@ import pandas as pd
 import geopandas as gpd
 import rasterio
 import rasterio.sample
-from rasterio.windows import Window
+import rasterio.shutil
+from rasterio.enums import Resampling
 import os
 import re
 import numpy as np
 import glob
+import json
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Shared pipeline definitions (relative import when run through the
+# orchestrator, plain import when the script is run directly)
+try:
+    from .common import (
+        JP2_PATTERN, LUCAS_PARQUET_PATH, MANIFEST_NAME, SENTINEL_COLS, is_fresh, normalized_difference
+    )
+except ImportError:
+    from common import (
+        JP2_PATTERN, LUCAS_PARQUET_PATH, MANIFEST_NAME, SENTINEL_COLS, is_fresh, normalized_difference
+    )
 
 # --- 1. Configuration ---
 LUCAS_FILE_PATH = 'data/external/LUCAS SOIL Modified.csv'
 YIELD_DIR = 'data/raw/fao_gaez/'
-OUTPUT_CSV_PATH = 'data/processed/LUCAS_with_Raster_Features.csv'
+OUTPUT_PARQUET_PATH = 'data/processed/LUCAS_with_Raster_Features.parquet'
+
+# GDAL configuration for every raster opened in this script:
+# - multi-threaded JPEG2000/DEFLATE decoding on all cores
+# - no directory listing on each open (SAFE folders hold many files)
+# - a block cache (MB) large enough to keep a decoded JP2 tile resident
+GDAL_ENV_OPTIONS = {
+    'GDAL_NUM_THREADS': 'ALL_CPUS',
+    'GDAL_DISABLE_READDIR_ON_OPEN': 'EMPTY_DIR',
+    'GDAL_CACHEMAX': 1024,
+}
+
+# Creation options for the tiled GeoTIFF copies of the JP2 bands
+COG_CREATION_OPTIONS = {
+    'tiled': True,
+    'blockxsize': 512,
+    'blockysize': 512,
+    'compress': 'deflate',
+    'predictor': 2,
+}
+COG_OVERVIEW_FACTORS = [2, 4, 8, 16]
+
+# Row/col offsets of the 3x3 neighbours, in the same row-major order as
+# patch.flatten() (pixel 5 is the center)
+NEIGHBOR_ROW_OFFSETS = np.array([-1, -1, -1, 0, 0, 0, 1, 1, 1])
+NEIGHBOR_COL_OFFSETS = np.array([-1, 0, 1, -1, 0, 1, -1, 0, 1])
+
+# Spectral band token in Sentinel-2 L2A image names, e.g. T32TQM_..._B8A_20m.jp2
+BAND_RE = re.compile(r'_(B(?:0[1-9]|1[0-2]|8A))_')
 
 # --- 2. Helper Functions ---
 def find_safe_directory():
@@ -24,217 +67,323 @@ def find_safe_directory():
     return None
 
 def find_jp2_files(safe_dir):
-    """Find all .jp2 files in the SAFE directory structure"""
-    jp2_files = []
-    
-    # Search in all possible locations
-    patterns = [
-        os.path.join(safe_dir, 'GRANULE', '*', 'IMG_DATA', 'R10m', '*.jp2'),
-        os.path.join(safe_dir, 'GRANULE', '*', 'IMG_DATA', 'R20m', '*.jp2'),
-        os.path.join(safe_dir, 'GRANULE', '*', 'IMG_DATA', 'R60m', '*.jp2'),
-    ]
-    
-    for pattern in patterns:
-        jp2_files.extend(glob.glob(pattern))
-    
-    return jp2_files
-
-def extract_band_name(filename):
-    """Extract band name from filename, return None for non-band files"""
-    # Skip non-band files (AOT, TCI, WVP, SCL)
-    skip_patterns = ['AOT', 'TCI', 'WVP', 'SCL']
-    if any(pattern in filename for pattern in skip_patterns):
-        return None
-    
-    # Extract band name using multiple patterns
-    patterns = [
-        r'_(B(0[1-9]|1[0-2]|8A))_',
-        r'_([A-Z0-9]{3})\.jp2$'
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, filename)
-        if match:
-            return match.group(1)
-    
-    return None
-
-# --- 3. Load Ground-Truth (LUCAS) Data ---
-print(f"1. Loading LUCAS data from {LUCAS_FILE_PATH}...")
-try:
-    df_lucas = pd.read_csv(LUCAS_FILE_PATH)
-except FileNotFoundError:
-    print(f"❌ Error: LUCAS file not found at {LUCAS_FILE_PATH}")
-    exit(1)
-
-print(f"   Loaded {len(df_lucas)} soil sample points.")
-
-# Convert to GeoDataFrame
-gdf_lucas_wgs84 = gpd.GeoDataFrame(
-    df_lucas,
-    geometry=gpd.points_from_xy(df_lucas['TH_LONG'], df_lucas['TH_LAT']),
-    crs='EPSG:4326'
-)
-coords_wgs84 = [(pt.x, pt.y) for pt in gdf_lucas_wgs84.geometry]
-
-# --- 4. Sample Crop Yield (CRY) Features  ---
-print(f"2. Sampling Crop Yield (CRY) data from {YIELD_DIR}...")
-try:
-    yield_files = [f for f in os.listdir(YIELD_DIR) if f.endswith('.tif')]
-except FileNotFoundError:
-    print(f"   Warning: Yield directory not found at {YIELD_DIR}. Skipping.")
-    yield_files = []
-
-for filename in yield_files:
-    feature_name = os.path.splitext(filename)[0]
-    file_path = os.path.join(YIELD_DIR, filename)
-    
-    with rasterio.open(file_path) as src:
-        samples = [val[0] for val in src.sample(coords_wgs84)]
-        df_lucas[feature_name] = samples
-        print(f"   ...added feature: {feature_name}")
-
-# --- 5. Find and Process Downloaded Sentinel-2 Data ---
-print(f"3. Finding downloaded Sentinel-2 data...")
-safe_dir = find_safe_directory()
-if not safe_dir:
-    print(f"❌ Error: No .SAFE directory found in data/raw/")
-    print(f"   Make sure data_acquisition.py ran successfully first.")
-    exit(1)
-
-print(f"   Found SAFE directory: {safe_dir}")
-
-jp2_files = find_jp2_files(safe_dir)
-if not jp2_files:
-    print(f"❌ Error: No .jp2 files found in {safe_dir}")
-    exit(1)
-
-print(f"   Found {len(jp2_files)} JP2 files")
-
-# Filter only band files and remove duplicates
-band_files = []
-processed_bands = set()
-
-for file_path in jp2_files:
-    filename = os.path.basename(file_path)
-    band_name = extract_band_name(filename)
-    
-    if band_name and band_name not in processed_bands:
-        band_files.append((file_path, band_name))
-        processed_bands.add(band_name)
-    elif band_name is None:
-        print(f"   ⚠️  Skipping non-band file: {filename}")
+    """
+    Find all .jp2 files in the SAFE image folders, 10m before 20m before 60m.
+    Uses the manifest written at download time when there is one, instead of
+    walking the SAFE tree.
+    """
+    manifest_path = os.path.join(safe_dir, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            jp2_paths = [Path(safe_dir, entry['path']) for entry in json.load(f)['jp2_files']]
     else:
-        print(f"   ⚠️  Skipping duplicate band: {band_name}")
-
-print(f"   Processing {len(band_files)} unique bands: {sorted(processed_bands)}")
-
-# Get the target CRS from the first Sentinel file
-target_crs = None
-with rasterio.open(band_files[0][0]) as src:
-    target_crs = src.crs
-
-print(f"   Target CRS (from satellite data): {target_crs}")
-
-# Reproject LUCAS points to match the Sentinel CRS
-gdf_projected = gdf_lucas_wgs84.to_crs(target_crs)
-coords_projected = [(pt.x, pt.y) for pt in gdf_projected.geometry]
-
-print(f"4. Extracting 3x3 neighbor pixels (SURR) for {len(coords_projected)} points...")
-
-# Collect all band data first, then add to DataFrame at once (for performance)
-all_band_data = {}
+        jp2_paths = Path(safe_dir).glob(JP2_PATTERN)
+    return [str(p) for p in sorted(jp2_paths, key=lambda p: (p.parent.name, p.name))]
 
-for file_path, band_name in band_files:
-    print(f"   Processing {band_name}...")
+def extract_band_name(filename):
+    """Extract band name from filename, return None for non-band files (AOT, TCI, WVP, SCL)"""
+    match = BAND_RE.search(filename)
+    return match.group(1) if match else None
+
+def open_band(file_path):
+    """Open a band raster, caching single-tiled JP2s as one decoded block"""
+    if file_path.endswith('.jp2'):
+        # Sentinel-2 JP2s are stored as a single JPEG2000 tile. Without this
+        # option every small window read re-decodes the whole tile.
+        return rasterio.open(file_path, USE_TILE_AS_BLOCK='YES')
+    return rasterio.open(file_path)
+
+def convert_jp2_to_cog(jp2_path):
+    """Convert a JP2 band to a tiled DEFLATE GeoTIFF once and return its path"""
+    tif_path = os.path.splitext(jp2_path)[0] + '.tif'
+    if os.path.exists(tif_path):
+        return tif_path
+
+    # Write to a temporary file so an interrupted run never leaves a partial copy
+    tmp_path = tif_path + '.tmp'
+    with open_band(jp2_path) as src:
+        rasterio.shutil.copy(src, tmp_path, driver='GTiff', **COG_CREATION_OPTIONS)
+    with rasterio.open(tmp_path, 'r+') as dst:
+        dst.build_overviews(COG_OVERVIEW_FACTORS, Resampling.average)
+    os.replace(tmp_path, tif_path)
+    return tif_path
+
+def npy_path_for(tif_path):
+    """Path of the raw .npy copy of a band GeoTIFF"""
+    return os.path.splitext(tif_path)[0] + '.npy'
+
+def convert_band_to_npy(tif_path, npy_path):
+    """Dump band 1 of a GeoTIFF to a raw .npy file once so it can be memory-mapped"""
+    if os.path.exists(npy_path):
+        return npy_path
+
+    with rasterio.open(tif_path) as src:
+        arr = src.read(1)
+    # Write through a file handle (np.save would append '.npy' to the name) and
+    # move into place so an interrupted run never leaves a partial copy
+    tmp_path = npy_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, arr)
+    os.replace(tmp_path, npy_path)
+    return npy_path
+
+def rowcol_from_transform(transform, xs, ys):
+    """rasterio.transform.rowcol() in NumPy: (rows, cols) via the inverse affine transform"""
+    inv = ~transform
+    cols = np.floor(inv.a * xs + inv.b * ys + inv.c).astype(np.int64)
+    rows = np.floor(inv.d * xs + inv.e * ys + inv.f).astype(np.int64)
+    return rows, cols
+
+def sample_patches(arr, rows, cols):
+    """Return the flattened 3x3 patch around each (row, col) as an (N, 9) array.
+
+    arr is the whole band (typically a memory-mapped .npy), and all
+    neighbours are gathered with one NumPy fancy-index. Neighbours that fall
+    outside the raster are NaN.
+    """
+    height, width = arr.shape
+
+    rr = rows[:, None] + NEIGHBOR_ROW_OFFSETS
+    cc = cols[:, None] + NEIGHBOR_COL_OFFSETS
+    valid = (rr >= 0) & (rr < height) & (cc >= 0) & (cc < width)
+    values = arr[rr.clip(0, height - 1), cc.clip(0, width - 1)]
+
+    return np.where(valid, values, np.nan).astype(np.float32)
+
+def sample_points_sorted(src, xs, ys):
+    """Sample band 1 at each (x, y), visiting the points in raster order.
+
+    Sorting by (row, col) keeps consecutive samples on the same blocks, so
+    sample_gen is served from the GDAL block cache. Values are returned in
+    the original point order.
+    """
+    rows, cols = rowcol_from_transform(src.transform, xs, ys)
+    order = np.lexsort((cols, rows))
+    coords_sorted = np.column_stack([xs, ys])[order]
+
+    samples = np.empty(len(order), dtype=src.dtypes[0])
+    samples[order] = np.fromiter(
+        (val[0] for val in src.sample(coords_sorted, indexes=1)),
+        dtype=samples.dtype,
+        count=len(order)
+    )
+    return samples
+
+def unique_pixels(rows, cols):
+    """Collapse point (row, col) indices to unique pixels.
+
+    Returns the (M, 2) unique pixels and, for every point, the index of its
+    pixel, since many points usually share one.
+    """
+    pixels, inverse = np.unique(np.column_stack([rows, cols]), axis=0, return_inverse=True)
+    return pixels, inverse.ravel()
+
+def sample_band(file_path, pixels, inverse):
+    """Sample the 3x3 SURR patches of one band as an (N, 9) float32 array.
+
+    Runs in a worker process and only receives the path plus the precomputed
+    pixel indices of its grid. Pixel values come from the band's
+    memory-mapped .npy copy, so the page cache serves them without any
+    decoding.
+    """
+    # Gather each unique pixel once, then expand back to every point
+    arr = np.load(npy_path_for(file_path), mmap_mode='r')
+    return sample_patches(arr, pixels[:, 0], pixels[:, 1])[inverse]
+
+def main():
+    """Run the raster feature extraction with GDAL tuned for throughput"""
+    # OpenJPEG reads its thread count from the environment, not GDAL config
+    os.environ.setdefault('OPJ_NUM_THREADS', str(os.cpu_count() or 1))
+    with rasterio.Env(**GDAL_ENV_OPTIONS):
+        extract_raster_features()
+
+def extract_raster_features():
+    # --- 3. Load Ground-Truth (LUCAS) Data ---
+    print(f"1. Loading LUCAS data from {LUCAS_FILE_PATH}...")
+    try:
+        # Prefer the Parquet copy unless the CSV has changed since it was written
+        if is_fresh(LUCAS_PARQUET_PATH, LUCAS_FILE_PATH):
+            df_lucas = pd.read_parquet(LUCAS_PARQUET_PATH, engine='pyarrow', memory_map=True)
+        else:
+            # The pyarrow parser is multi-threaded and much faster than the default
+            # one. The unnamed first column is the saved row index, so read it as
+            # the index rather than as a column named ''.
+            df_lucas = pd.read_csv(LUCAS_FILE_PATH, engine='pyarrow', index_col=0)
+    except FileNotFoundError:
+        print(f"❌ Error: LUCAS file not found at {LUCAS_FILE_PATH}")
+        exit(1)
+
+    print(f"   Loaded {len(df_lucas)} soil sample points.")
+
+    # Convert to GeoDataFrame
+    gdf_lucas_wgs84 = gpd.GeoDataFrame(
+        df_lucas,
+        geometry=gpd.points_from_xy(df_lucas['TH_LONG'], df_lucas['TH_LAT']),
+        crs='EPSG:4326'
+    )
+    xs_wgs84 = gdf_lucas_wgs84.geometry.x.to_numpy()
+    ys_wgs84 = gdf_lucas_wgs84.geometry.y.to_numpy()
+
+    # --- 4. Sample Crop Yield (CRY) Features  ---
+    print(f"2. Sampling Crop Yield (CRY) data from {YIELD_DIR}...")
+    try:
+        yield_files = [f for f in os.listdir(YIELD_DIR) if f.endswith('.tif')]
+    except FileNotFoundError:
+        print(f"   Warning: Yield directory not found at {YIELD_DIR}. Skipping.")
+        yield_files = []
+
+    for filename in yield_files:
+        feature_name = os.path.splitext(filename)[0]
+        file_path = os.path.join(YIELD_DIR, filename)
     
-    # Create 9 new column names for this band
-    neighbor_cols = [f"{band_name}_{i+1}" for i in range(9)]
-    band_data_3x3 = np.zeros((len(coords_projected), 9), dtype=np.float32)
-    band_data_3x3[:] = np.nan  # Initialize with NaN
-
-    with rasterio.open(file_path) as src:
-        for i, (x, y) in enumerate(coords_projected):
-            try:
-                # Get the row, col index for the center pixel
-                row, col = src.index(x, y)
-                # Define a 3x3 window centered on the pixel 
-                window = Window(col - 1, row - 1, 3, 3)
-                # Read the 3x3 patch
-                patch = src.read(1, window=window)
-                # Flatten the 3x3 patch into a 1x9 array
-                band_data_3x3[i] = patch.flatten()
-            except (ValueError, IndexError, rasterio.errors.WindowError):
-                # Point is outside the raster bounds
-                band_data_3x3[i] = np.nan
-            except Exception as e:
-                print(f"   ⚠️  Error sampling point {i} for {band_name}: {e}")
-                band_data_3x3[i] = np.nan
+        with rasterio.open(file_path) as src:
+            df_lucas[feature_name] = sample_points_sorted(src, xs_wgs84, ys_wgs84)
+            print(f"   ...added feature: {feature_name}")
+
+    # --- 5. Find and Process Downloaded Sentinel-2 Data ---
+    print(f"3. Finding downloaded Sentinel-2 data...")
+    safe_dir = find_safe_directory()
+    if not safe_dir:
+        print(f"❌ Error: No .SAFE directory found in data/raw/")
+        print(f"   Make sure data_acquisition.py ran successfully first.")
+        exit(1)
+
+    print(f"   Found SAFE directory: {safe_dir}")
+
+    jp2_files = find_jp2_files(safe_dir)
+    if not jp2_files:
+        print(f"❌ Error: No .jp2 files found in {safe_dir}")
+        exit(1)
+
+    print(f"   Found {len(jp2_files)} JP2 files")
+
+    # Filter only band files and remove duplicates
+    band_files = []
+    processed_bands = set()
+
+    for file_path in jp2_files:
+        filename = os.path.basename(file_path)
+        band_name = extract_band_name(filename)
     
-    # Store band data for later concatenation
-    for j, col_name in enumerate(neighbor_cols):
-        all_band_data[col_name] = band_data_3x3[:, j]
-
-# Add all band data to DataFrame at once (performance improvement)
-print("   Adding all band data to DataFrame...")
-band_df = pd.DataFrame(all_band_data)
-df_lucas = pd.concat([df_lucas, band_df], axis=1)
-
-# --- 6. Calculate Vegetation Indices from Center Pixel ---
-print("5. Calculating Vegetation Indices from center pixels...")
-
-# Use pixel 5 (index 4) as the center of the 3x3 grid
-center_suffix = '_5'
-
-# Calculate indices using vectorized operations (performance improvement)
-vi_data = {}
-
-try:
-    # NDVI: (B08 - B04) / (B08 + B04)
-    if f'B08{center_suffix}' in df_lucas.columns and f'B04{center_suffix}' in df_lucas.columns:
-        b08 = df_lucas[f'B08{center_suffix}']
-        b04 = df_lucas[f'B04{center_suffix}']
-        vi_data['NDVI'] = (b08 - b04) / (b08 + b04)
-        print("   ✅ Calculated NDVI")
+        if band_name and band_name not in processed_bands:
+            band_files.append((file_path, band_name))
+            processed_bands.add(band_name)
+        elif band_name is None:
+            print(f"   ⚠️  Skipping non-band file: {filename}")
+        else:
+            print(f"   ⚠️  Skipping duplicate band: {band_name}")
+
+    print(f"   Processing {len(band_files)} unique bands: {sorted(processed_bands)}")
+
+    # Decode each JP2 once into a tiled GeoTIFF and a raw .npy for sampling;
+    # later runs reuse the copies
+    print("   Converting JP2 bands to tiled GeoTIFF/.npy (skipped if already converted)...")
+    band_files = [(convert_jp2_to_cog(file_path), band_name) for file_path, band_name in band_files]
+    for file_path, _ in band_files:
+        convert_band_to_npy(file_path, npy_path_for(file_path))
+
+    # Get the target CRS from the first Sentinel file
+    target_crs = None
+    with rasterio.open(band_files[0][0]) as src:
+        target_crs = src.crs
+
+    print(f"   Target CRS (from satellite data): {target_crs}")
+
+    # Reproject LUCAS points to match the Sentinel CRS
+    gdf_projected = gdf_lucas_wgs84.to_crs(target_crs)
+    xs_projected = gdf_projected.geometry.x.to_numpy()
+    ys_projected = gdf_projected.geometry.y.to_numpy()
+
+    print(f"4. Extracting 3x3 neighbor pixels (SURR) for {len(xs_projected)} points...")
+
+    # Bands sharing a grid (R10m, R20m, R60m) share the point -> pixel mapping,
+    # so compute it once per (transform, CRS, shape) rather than once per band
+    grid_pixels = {}
+    band_grids = {}
+    for file_path, band_name in band_files:
+        with rasterio.open(file_path) as src:
+            grid = (src.transform, src.crs.to_wkt(), src.shape)
+            if grid not in grid_pixels:
+                rows, cols = rowcol_from_transform(src.transform, xs_projected, ys_projected)
+                grid_pixels[grid] = unique_pixels(rows, cols)
+        band_grids[band_name] = grid
+
+    print(f"   {len(band_files)} bands on {len(grid_pixels)} distinct pixel grids")
+
+    # Each band is independent, so sample them in parallel worker processes.
+    # Only paths and pixel indices are sent to the workers.
+    # All SURR values go into one preallocated float32 block, 9 columns per
+    # band in band order, which becomes a single DataFrame block at the end
+    all_bands = np.empty((len(xs_projected), len(band_files) * 9), dtype=np.float32)
+    band_offsets = {band_name: i * 9 for i, (_, band_name) in enumerate(band_files)}
+    neighbor_cols = [f"{band_name}_{j+1}" for _, band_name in band_files for j in range(9)]
+
+    with ProcessPoolExecutor(max_workers=min(len(band_files), os.cpu_count() or 1)) as executor:
+        futures = {
+            executor.submit(sample_band, file_path, *grid_pixels[band_grids[band_name]]): band_name
+            for file_path, band_name in band_files
+        }
+        for future in as_completed(futures):
+            band_name = futures[future]
+            offset = band_offsets[band_name]
+            all_bands[:, offset:offset + 9] = future.result()
+            print(f"   ...sampled {band_name}")
+
+    # Add all band data to DataFrame at once (performance improvement)
+    print("   Adding all band data to DataFrame...")
+    band_df = pd.DataFrame(all_bands, columns=neighbor_cols, index=df_lucas.index)
+    df_lucas = pd.concat([df_lucas, band_df], axis=1)
+
+    # --- 6. Calculate Vegetation Indices from Center Pixel ---
+    print("5. Calculating Vegetation Indices from center pixels...")
+
+    # Use pixel 5 (index 4) as the center of the 3x3 grid
+    center_suffix = '_5'
+
+    # Calculate indices on float32 NumPy arrays (performance improvement)
+    vi_data = {}
+
+    try:
+        # NDVI: (B08 - B04) / (B08 + B04)
+        if f'B08{center_suffix}' in df_lucas.columns and f'B04{center_suffix}' in df_lucas.columns:
+            vi_data['NDVI'] = normalized_difference(df_lucas, f'B08{center_suffix}', f'B04{center_suffix}')
+            print("   ✅ Calculated NDVI")
     
-    # NDRE: (B08 - B05) / (B08 + B05)  
-    if f'B08{center_suffix}' in df_lucas.columns and f'B05{center_suffix}' in df_lucas.columns:
-        b08 = df_lucas[f'B08{center_suffix}']
-        b05 = df_lucas[f'B05{center_suffix}']
-        vi_data['NDRE'] = (b08 - b05) / (b08 + b05)
-        print("   ✅ Calculated NDRE")
+        # NDRE: (B08 - B05) / (B08 + B05)  
+        if f'B08{center_suffix}' in df_lucas.columns and f'B05{center_suffix}' in df_lucas.columns:
+            vi_data['NDRE'] = normalized_difference(df_lucas, f'B08{center_suffix}', f'B05{center_suffix}')
+            print("   ✅ Calculated NDRE")
     
-    # GNDVI: (B08 - B03) / (B08 + B03)
-    if f'B08{center_suffix}' in df_lucas.columns and f'B03{center_suffix}' in df_lucas.columns:
-        b08 = df_lucas[f'B08{center_suffix}']
-        b03 = df_lucas[f'B03{center_suffix}']
-        vi_data['GNDVI'] = (b08 - b03) / (b08 + b03)
-        print("   ✅ Calculated GNDVI")
+        # GNDVI: (B08 - B03) / (B08 + B03)
+        if f'B08{center_suffix}' in df_lucas.columns and f'B03{center_suffix}' in df_lucas.columns:
+            vi_data['GNDVI'] = normalized_difference(df_lucas, f'B08{center_suffix}', f'B03{center_suffix}')
+            print("   ✅ Calculated GNDVI")
         
-except Exception as e:
-    print(f"   ⚠️  Error calculating vegetation indices: {e}")
-
-# Add all VI data at once
-vi_df = pd.DataFrame(vi_data)
-df_lucas = pd.concat([df_lucas, vi_df], axis=1)
-
-# Replace inf/-inf values with NaN
-df_lucas.replace([np.inf, -np.inf], np.nan, inplace=True)
-
-# --- 7. Save Final Merged CSV ---
-print("6. Saving merged raster features...")
-os.makedirs('data/processed', exist_ok=True)
-df_lucas.to_csv(OUTPUT_CSV_PATH, index=False)
-
-# Print summary statistics
-sentinel_features = [col for col in df_lucas.columns if re.match(r'B(0[1-9]|1[0-2]|8A)_\d', col)]
-vi_features = [col for col in df_lucas.columns if col in ['NDVI', 'NDRE', 'GNDVI']]
-yield_features = [col for col in df_lucas.columns if col.startswith('yld_')]
-
-print(f"\n✅ Success! Merged data saved to {OUTPUT_CSV_PATH}")
-print(f"   Total samples: {len(df_lucas)}")
-print(f"   Sentinel features: {len(sentinel_features)}")
-print(f"   Vegetation indices: {len(vi_features)}")
-print(f"   Yield features: {len(yield_features)}")
-print(f"   Total features: {len(df_lucas.columns)}")
-print("   Next step: Run `src/add_weather_features.py`")
\ No newline at end of file
+    except Exception as e:
+        print(f"   ⚠️  Error calculating vegetation indices: {e}")
+
+    # Add all VI data at once (division by zero is already NaN, no inf scan needed)
+    vi_df = pd.DataFrame(vi_data, index=df_lucas.index)
+    df_lucas = pd.concat([df_lucas, vi_df], axis=1)
+
+    # --- 7. Save Merged Raster Features (Parquet) ---
+    print("6. Saving merged raster features...")
+    os.makedirs('data/processed', exist_ok=True)
+    # Typed, compressed columns are far smaller and faster to load than CSV
+    df_lucas.to_parquet(OUTPUT_PARQUET_PATH, engine='pyarrow', compression='zstd', index=False)
+
+    # Print summary statistics
+    sentinel_features = [col for col in df_lucas.columns if col in SENTINEL_COLS]
+    vi_features = [col for col in df_lucas.columns if col in ['NDVI', 'NDRE', 'GNDVI']]
+    yield_features = [col for col in df_lucas.columns if col.startswith('yld_')]
+
+    print(f"\n✅ Success! Merged data saved to {OUTPUT_PARQUET_PATH}")
+    print(f"   Total samples: {len(df_lucas)}")
+    print(f"   Sentinel features: {len(sentinel_features)}")
+    print(f"   Vegetation indices: {len(vi_features)}")
+    print(f"   Yield features: {len(yield_features)}")
+    print(f"   Total features: {len(df_lucas.columns)}")
+    print("   Next step: Run `src/add_weather_features.py`")
+
+if __name__ == "__main__":
+    main()
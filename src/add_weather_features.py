@@ -1,14 +1,17 @@
 # Save this file as: src/add_weather_features.py
 
+import os
+import asyncio
 import pandas as pd
 import numpy as np
-import requests
+import httpx
 import time
-from datetime import datetime
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 
 # --- 1. Configuration ---
-INPUT_CSV_PATH = 'data/processed/LUCAS_with_Raster_Features.csv'
-OUTPUT_CSV_PATH = 'data/processed/LUCAS_with_All_Features.csv'
+INPUT_PARQUET_PATH = 'data/processed/LUCAS_with_Raster_Features.parquet'
+OUTPUT_PARQUET_PATH = 'data/processed/LUCAS_with_All_Features.parquet'
 
 # Define weather variables to fetch - USING CORRECT NAMES
 WEATHER_VARIABLES = [
@@ -18,212 +21,362 @@ WEATHER_VARIABLES = [
     "precipitation_sum"
 ]
 
-# --- 2. Load Data ---
-print(f"1. Loading data from {INPUT_CSV_PATH}...")
-try:
-    df = pd.read_csv(INPUT_CSV_PATH)
-except FileNotFoundError:
-    print(f"❌ Error: {INPUT_CSV_PATH} not found. Run `add_raster_features.py` first.")
-    exit(1)
-
-print(f"   Loaded {len(df)} samples")
-
-# --- 3. Handle Dates ---
-print("2. Checking available date columns...")
-date_columns = [col for col in df.columns if 'DATE' in col.upper() or 'SURVEY' in col.upper()]
-print(f"   Available date-related columns: {date_columns}")
-
-# Use the first available date column, or fall back to a default date
-if date_columns:
-    date_column = date_columns[0]
-    print(f"   Using date column: {date_column}")
+# Concurrent requests to the Open-Meteo archive API. Requests are
+# multiplexed over HTTP/2, so they share a handful of connections.
+MAX_CONCURRENT_REQUESTS = 16
+MAX_CONNECTIONS = 50
+
+# Locations sent in one request (comma-separated latitude/longitude lists)
+BATCH_SIZE = 100
+
+# Overall rate allowed across all requests (be nice to the API). Open-Meteo
+# counts every location of a multi-location request against its quota, so
+# this is in locations, not requests.
+LOCATIONS_PER_SECOND = 10
+
+# Failed requests (rate limited, server errors, dropped connections) are
+# retried with exponential backoff, or after the server's Retry-After.
+# A batch whose Retry-After is longer than MAX_RETRY_DELAY is given up on.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0
+MAX_RETRY_DELAY = 60
+
+# Seed for the simulated weather used when the API has no data
+SIMULATION_SEED = 42
+
+# Seasonal climate used for the simulation, by month (Jan..Dec): base
+# temperature at 45°N and mean daily precipitation
+MONTH_TEMP_BASE = np.array([0, 0, 10, 10, 10, 20, 20, 20, 12, 12, 12, 0])
+MONTH_PRECIP_BASE = np.array([3.0, 3.0, 2.5, 2.5, 2.5, 2.0, 2.0, 2.0, 2.8, 2.8, 2.8, 3.0])
+# Month simulated for samples without a survey date (default spring date)
+DEFAULT_MONTH = 5
+# 1° latitude bands for the climatology table
+LAT_BAND_EDGES = np.arange(-90, 91)
+
+# Coordinates are rounded to 1e-7 degrees before being used as a lookup key
+COORD_SCALE = 10_000_000
+
+# --- Helper Functions ---
+def build_climatology():
+    """
+    Precompute the simulation climatology, indexed [month - 1, latitude band],
+    with (temp_mean, temp_sd, precip_rate, rh_lo, rh_hi) per entry.
+    Temperatures drop 0.5°C per degree north of 45°N.
+    """
+    band_centers = LAT_BAND_EDGES[:-1] + 0.5
+    table = np.empty((12, len(band_centers), 5))
+    table[..., 0] = MONTH_TEMP_BASE[:, None] + (band_centers[None, :] - 45) * (-0.5)
+    table[..., 1] = 3
+    table[..., 2] = MONTH_PRECIP_BASE[:, None]
+    table[..., 3] = 40
+    table[..., 4] = 85
+    return table
+
+CLIMATOLOGY = build_climatology()
+
+def simulate_weather(lats, months, rng):
+    """Draw simulated weather for arrays of latitudes/months from the climatology"""
+    bands = np.clip(np.digitize(lats, LAT_BAND_EDGES) - 1, 0, len(LAT_BAND_EDGES) - 2)
+    temp_mean, temp_sd, precip_rate, rh_lo, rh_hi = CLIMATOLOGY[months - 1, bands].T
     
-    # Try different date formats
-    try:
-        df['SURVEY_DATE_dt'] = pd.to_datetime(df[date_column], format='%d/%m/%Y')
-    except:
-        try:
-            df['SURVEY_DATE_dt'] = pd.to_datetime(df[date_column])
-        except:
-            print(f"   ⚠️  Could not parse dates from {date_column}, using default date")
-            df['SURVEY_DATE_dt'] = pd.to_datetime('2018-05-15')  # Default spring date
-else:
-    print("   ⚠️  No date columns found, using default spring sampling date")
-    df['SURVEY_DATE_dt'] = pd.to_datetime('2018-05-15')  # Default spring date
+    temperature = rng.normal(temp_mean, temp_sd)
+    return {
+        'temperature_2m': temperature,
+        'precipitation': rng.exponential(precip_rate),
+        'relative_humidity_2m': rng.uniform(rh_lo, rh_hi),
+        'dew_point_2m': temperature - rng.exponential(3, len(lats))
+    }
 
-# --- 4. Add Weather Features ---
-print(f"3. Adding weather features...")
+class RateLimiter:
+    """Token bucket shared by the concurrent fetch tasks"""
 
-# Initialize weather columns with NaN
-for var in WEATHER_VARIABLES:
-    # Use simpler column names
-    simple_name = var.replace('_mean', '').replace('_sum', '')
-    df[simple_name] = np.nan
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, tokens=1):
+        """Wait until `tokens` units (at most the capacity) may be spent"""
+        while True:
+            async with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+
+def parse_daily_values(location_data):
+    """
+    Extract the first day's value of each weather variable from one location
+    object of the API response, or None if it has no daily data
+    """
+    if 'daily' not in location_data:
+        return None
+    
+    daily_data = location_data['daily']
+    weather_values = {}
+    for var in WEATHER_VARIABLES:
+        if var in daily_data and len(daily_data[var]) > 0:
+            weather_values[var] = daily_data[var][0]
+        else:
+            weather_values[var] = np.nan
+    return weather_values
+
+def retry_delay(response, attempt):
+    """Seconds to wait before retrying: the response's Retry-After if set, else exponential backoff"""
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        # Either a number of seconds or an HTTP date
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            pass
+    return RETRY_BACKOFF * 2 ** attempt
 
 # Simple function to fetch weather data using direct HTTP requests
-def fetch_weather_data(lat, lon, date_str):
+async def fetch_weather_data(client, limiter, semaphore, lats, lons, date_str):
     """
-    Fetch weather data using direct HTTP request to avoid library issues
+    Fetch weather data for a batch of locations on one date with a single
+    HTTP request, retrying transient failures. Returns one dict of values
+    (or None) per location, or None if the whole request failed.
     """
     url = "https://archive-api.open-meteo.com/v1/archive"
     params = {
-        "latitude": lat,
-        "longitude": lon,
+        "latitude": ",".join(map(str, lats)),
+        "longitude": ",".join(map(str, lons)),
         "start_date": date_str,
         "end_date": date_str,
-        "daily": "temperature_2m_mean,relative_humidity_2m_mean,dew_point_2m_mean,precipitation_sum",
+        "daily": ",".join(WEATHER_VARIABLES),
         "timezone": "auto"
     }
     
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            if 'daily' in data:
-                daily_data = data['daily']
-                # Extract the first day's data
-                weather_values = {}
-                for var in WEATHER_VARIABLES:
-                    if var in daily_data and len(daily_data[var]) > 0:
-                        weather_values[var] = daily_data[var][0]
-                    else:
-                        weather_values[var] = np.nan
-                return weather_values
-        else:
+    for attempt in range(MAX_RETRIES + 1):
+        response = None
+        try:
+            async with semaphore:
+                # One token per location, matching how the API counts the request
+                await limiter.acquire(len(lats))
+                response = await client.get(url, params=params)
+            if response.status_code == 200:
+                data = response.json()
+                # A single location comes back as an object, several as a list
+                if isinstance(data, dict):
+                    data = [data]
+                if len(data) == len(lats):
+                    return [parse_daily_values(location_data) for location_data in data]
+                print(f"      API returned {len(data)} locations, expected {len(lats)}")
+                return None
             print(f"      API returned status {response.status_code}")
-    except Exception as e:
-        print(f"      Request failed: {e}")
+            if response.status_code not in RETRY_STATUSES:
+                return None
+        except httpx.TransportError as e:
+            # Timeouts and dropped connections are worth another try
+            print(f"      Request failed: {e}")
+        except Exception as e:
+            print(f"      Request failed: {e}")
+            return None
+
+        if attempt == MAX_RETRIES:
+            break
+        delay = retry_delay(response, attempt)
+        if delay > MAX_RETRY_DELAY:
+            print(f"      Server asked to wait {delay:.0f}s, giving up on this batch")
+            break
+        # Sleep outside the semaphore so other batches can use the slot
+        await asyncio.sleep(delay)
     
     return None
 
-# Group by unique combinations of lat, lon, and date to minimize API calls
-unique_coords_dates = df[['TH_LAT', 'TH_LONG', 'SURVEY_DATE_dt']].drop_duplicates()
-print(f"   Fetching weather for {len(unique_coords_dates)} unique locations...")
+async def fetch_all_batches(batches):
+    """
+    Fetch every batch concurrently over one HTTP/2 client, returning the
+    results in batch order
+    """
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+    # Room for one full batch, so a request never waits on a token it can't get
+    limiter = RateLimiter(LOCATIONS_PER_SECOND, capacity=BATCH_SIZE)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    
+    async with httpx.AsyncClient(http2=True, limits=limits, timeout=30) as client:
+        return await asyncio.gather(*(
+            fetch_weather_data(
+                client, limiter, semaphore,
+                [lat for _, lat, _, _ in batch],
+                [lon for _, _, lon, _ in batch],
+                # Format date for API (YYYY-MM-DD)
+                batch[0][3].strftime('%Y-%m-%d')
+            )
+            for batch in batches
+        ))
 
-success_count = 0
-fail_count = 0
+def main():
+    """Add Open-Meteo weather (simulated where unavailable) and seasonal features to the raster features"""
+    # --- 2. Load Data ---
+    print(f"1. Loading data from {INPUT_PARQUET_PATH}...")
+    try:
+        df = pd.read_parquet(INPUT_PARQUET_PATH, engine='pyarrow')
+    except FileNotFoundError:
+        print(f"❌ Error: {INPUT_PARQUET_PATH} not found. Run `add_raster_features.py` first.")
+        exit(1)
 
-for idx, (lat, lon, date_obj) in unique_coords_dates.iterrows():
-    # Format date for API (YYYY-MM-DD)
-    date_str = date_obj.strftime('%Y-%m-%d')
-    
-    print(f"   Fetching: {lat:.4f}, {lon:.4f}, {date_str}...")
-    
-    # Fetch weather data
-    weather_data = fetch_weather_data(lat, lon, date_str)
+    print(f"   Loaded {len(df)} samples")
+
+    # --- 3. Handle Dates ---
+    print("2. Checking available date columns...")
+    date_columns = [col for col in df.columns if 'DATE' in col.upper() or 'SURVEY' in col.upper()]
+    print(f"   Available date-related columns: {date_columns}")
+
+    # Use the first available date column, or fall back to a default date
+    if date_columns:
+        date_column = date_columns[0]
+        print(f"   Using date column: {date_column}")
     
-    if weather_data:
-        # Find all rows with this lat/lon/date and update them
-        mask = (df['TH_LAT'] == lat) & (df['TH_LONG'] == lon) & (df['SURVEY_DATE_dt'] == date_obj)
-        
-        for var in WEATHER_VARIABLES:
-            simple_name = var.replace('_mean', '').replace('_sum', '')
-            df.loc[mask, simple_name] = weather_data[var]
-        
-        success_count += 1
+        # Try different date formats
+        try:
+            df['SURVEY_DATE_dt'] = pd.to_datetime(df[date_column], format='%d/%m/%Y')
+        except:
+            try:
+                df['SURVEY_DATE_dt'] = pd.to_datetime(df[date_column])
+            except:
+                print(f"   ⚠️  Could not parse dates from {date_column}, using default date")
+                df['SURVEY_DATE_dt'] = pd.to_datetime('2018-05-15')  # Default spring date
     else:
-        print(f"   ⚠️  Could not fetch weather for {lat:.4f}, {lon:.4f}, {date_str}")
-        fail_count += 1
-        
-        # Use simulated data for failed points
-        mask = (df['TH_LAT'] == lat) & (df['TH_LONG'] == lon) & (df['SURVEY_DATE_dt'] == date_obj)
-        np.random.seed(int(lat * 1000 + lon * 100))  # Seed based on location for consistency
-        
-        # Simulate realistic weather based on season and location
-        month = date_obj.month
-        # Seasonal adjustments
-        if month in [12, 1, 2]:  # Winter
-            temp_base = 0 + (lat - 45) * (-0.5)  # Colder in north
-            precip_base = 3.0
-        elif month in [3, 4, 5]:  # Spring
-            temp_base = 10 + (lat - 45) * (-0.5)
-            precip_base = 2.5
-        elif month in [6, 7, 8]:  # Summer  
-            temp_base = 20 + (lat - 45) * (-0.5)
-            precip_base = 2.0
-        else:  # Fall
-            temp_base = 12 + (lat - 45) * (-0.5)
-            precip_base = 2.8
-        
-        df.loc[mask, 'temperature_2m'] = temp_base + np.random.normal(0, 3, mask.sum())
-        df.loc[mask, 'precipitation'] = np.maximum(0, np.random.exponential(precip_base, mask.sum()))
-        df.loc[mask, 'relative_humidity_2m'] = np.random.uniform(40, 85, mask.sum())
-        df.loc[mask, 'dew_point_2m'] = df.loc[mask, 'temperature_2m'] - np.random.exponential(3, mask.sum())
+        print("   ⚠️  No date columns found, using default spring sampling date")
+        df['SURVEY_DATE_dt'] = pd.to_datetime('2018-05-15')  # Default spring date
+
+    # --- 4. Add Weather Features ---
+    print(f"3. Adding weather features...")
+
+    # Initialize weather columns with NaN
+    for var in WEATHER_VARIABLES:
+        # Use simpler column names
+        simple_name = var.replace('_mean', '').replace('_sum', '')
+        df[simple_name] = np.nan
+
+    # Column positions of the weather columns, in WEATHER_VARIABLES order
+    weather_cols = [var.replace('_mean', '').replace('_sum', '') for var in WEATHER_VARIABLES]
+    weather_col_pos = {col: df.columns.get_loc(col) for col in weather_cols}
+
+    # Group by unique combinations of lat, lon, and date to minimize API calls
+    # Number every lat/lon/date combination with one int64 key: hashing and
+    # comparing it is much cheaper than matching three columns, and rounding
+    # makes it robust to float noise in the stored coordinates. The key comes
+    # from a single joint grouping, so it is unique per combination (missing
+    # dates included) by construction.
+    lat_int = np.round(df['TH_LAT'].to_numpy(dtype=np.float64) * COORD_SCALE).astype(np.int64)
+    lon_int = np.round(df['TH_LONG'].to_numpy(dtype=np.float64) * COORD_SCALE).astype(np.int64)
+    df['_key'] = df.groupby([lat_int, lon_int, df['SURVEY_DATE_dt']], sort=False, dropna=False).ngroup()
+
+    # Points without a survey date cannot be queried; they are simulated below
+    has_date = df['SURVEY_DATE_dt'].notna()
+    if not has_date.all():
+        print(f"   ⚠️  {(~has_date).sum()} samples have no survey date and will use simulated weather")
+    unique_coords_dates = df.loc[has_date, ['_key', 'TH_LAT', 'TH_LONG', 'SURVEY_DATE_dt']].drop_duplicates('_key')
+
+    # The API accepts many coordinates per request as long as they share the
+    # date range, so batch the unique locations of each date
+    batches = []
+    for _, date_group in unique_coords_dates.groupby('SURVEY_DATE_dt'):
+        keys = list(date_group.itertuples(index=False, name=None))
+        for start in range(0, len(keys), BATCH_SIZE):
+            batches.append(keys[start:start + BATCH_SIZE])
+
+    print(f"   Fetching weather for {len(unique_coords_dates)} unique locations in {len(batches)} requests...")
+
+    # Row positions of every lat/lon/date key, so results can be written back
+    # without scanning the whole DataFrame for each location
+    idx_map = df.groupby('_key').indices
+
+    success_count = 0
+    fail_count = 0
+
+    all_batch_results = asyncio.run(fetch_all_batches(batches))
+
+    for batch, batch_results in zip(batches, all_batch_results):
+        batch_results = batch_results or [None] * len(batch)
     
-    # Progress reporting
-    if (success_count + fail_count) % 50 == 0:
-        print(f"   ...processed {success_count + fail_count}/{len(unique_coords_dates)} locations")
+        for (key, lat, lon, date_obj), weather_data in zip(batch, batch_results):
+            if weather_data:
+                # Update all rows with this lat/lon/date in a single assignment
+                rows = idx_map[key]
+                values = np.array([weather_data[var] for var in WEATHER_VARIABLES], dtype=float)
+                df.iloc[rows, list(weather_col_pos.values())] = np.broadcast_to(values, (len(rows), len(values)))
     
-    # Rate limiting - be nice to the API
-    time.sleep(0.1)
+                success_count += 1
+            else:
+                # Failed points stay NaN and are simulated below
+                print(f"   ⚠️  Could not fetch weather for {lat:.4f}, {lon:.4f}, {date_obj:%Y-%m-%d}")
+                fail_count += 1
 
-print(f"   Weather data: {success_count} successful, {fail_count} failed")
+            # Progress reporting
+            if (success_count + fail_count) % 50 == 0:
+                print(f"   ...processed {success_count + fail_count}/{len(unique_coords_dates)} locations")
 
-# Fill any remaining NaN values with simulated data
-missing_mask = df[['temperature_2m', 'precipitation', 'relative_humidity_2m', 'dew_point_2m']].isna().any(axis=1)
-if missing_mask.any():
-    print(f"   Adding simulated weather for {missing_mask.sum()} remaining missing points")
+    print(f"   Weather data: {success_count} successful, {fail_count} failed")
+
+    # Fill any remaining NaN values with simulated data
+    missing_mask = df[['temperature_2m', 'precipitation', 'relative_humidity_2m', 'dew_point_2m']].isna().any(axis=1)
+    if missing_mask.any():
+        print(f"   Adding simulated weather for {missing_mask.sum()} remaining missing points")
     
-    # More realistic simulation based on location and date
-    for idx in df[missing_mask].index:
-        lat = df.loc[idx, 'TH_LAT']
-        lon = df.loc[idx, 'TH_LONG']
-        date_obj = df.loc[idx, 'SURVEY_DATE_dt']
-        month = date_obj.month
-        
-        # Seasonal and geographic adjustments
-        if month in [12, 1, 2]:  # Winter
-            temp_base = 0 + (lat - 45) * (-0.5)
-            precip_base = 3.0
-        elif month in [3, 4, 5]:  # Spring
-            temp_base = 10 + (lat - 45) * (-0.5)
-            precip_base = 2.5
-        elif month in [6, 7, 8]:  # Summer
-            temp_base = 20 + (lat - 45) * (-0.5)  
-            precip_base = 2.0
-        else:  # Fall
-            temp_base = 12 + (lat - 45) * (-0.5)
-            precip_base = 2.8
-        
-        np.random.seed(int(lat * 1000 + lon * 100 + month))
-        
-        df.loc[idx, 'temperature_2m'] = temp_base + np.random.normal(0, 3)
-        df.loc[idx, 'precipitation'] = max(0, np.random.exponential(precip_base))
-        df.loc[idx, 'relative_humidity_2m'] = np.random.uniform(40, 85)
-        df.loc[idx, 'dew_point_2m'] = df.loc[idx, 'temperature_2m'] - np.random.exponential(3)
-
-# --- 5. Add Seasonal Features ---
-print("4. Adding seasonal features...")
-
-# Extract month from sampling date
-df['month'] = df['SURVEY_DATE_dt'].dt.month
-
-# Add seasonal indicators
-seasons = {
-    'winter': [12, 1, 2],
-    'spring': [3, 4, 5], 
-    'summer': [6, 7, 8],
-    'fall': [9, 10, 11]
-}
-
-for season, months in seasons.items():
-    df[f'is_{season}'] = df['month'].isin(months).astype(int)
-
-print("   ✅ Added seasonal features")
-
-# --- 6. Save Final Dataset ---
-print(f"5. Saving final dataset to {OUTPUT_CSV_PATH}...")
-# Drop the temporary datetime and month columns
-df.drop(columns=['SURVEY_DATE_dt', 'month'], inplace=True)
-os.makedirs('data/processed', exist_ok=True)
-df.to_csv(OUTPUT_CSV_PATH, index=False)
-
-# Print final summary
-print(f"\n✅ Success! Final dataset with all features saved to {OUTPUT_CSV_PATH}")
-print(f"   Final dataset shape: {df.shape}")
-print(f"   Weather statistics:")
-print(f"   - Temperature: {df['temperature_2m'].mean():.1f}°C ± {df['temperature_2m'].std():.1f}°C")
-print(f"   - Precipitation: {df['precipitation'].mean():.1f}mm ± {df['precipitation'].std():.1f}mm")
-print(f"   - Humidity: {df['relative_humidity_2m'].mean():.1f}% ± {df['relative_humidity_2m'].std():.1f}%")
-print(f"   - Dew Point: {df['dew_point_2m'].mean():.1f}°C ± {df['dew_point_2m'].std():.1f}°C")
-print("   Next step: Run `src/train_model.py`")
\ No newline at end of file
+        # Simulation based on location and date from the precomputed climatology,
+        # drawn for all missing rows at once from one seeded generator
+        rng = np.random.default_rng(SIMULATION_SEED)
+        simulated = simulate_weather(
+            df.loc[missing_mask, 'TH_LAT'].to_numpy(),
+            # Samples without a date use the default spring sampling month
+            df.loc[missing_mask, 'SURVEY_DATE_dt'].dt.month.fillna(DEFAULT_MONTH).to_numpy(dtype=np.int64),
+            rng
+        )
+        for col, values in simulated.items():
+            df.loc[missing_mask, col] = values
+
+    # --- 5. Add Seasonal Features ---
+    print("4. Adding seasonal features...")
+
+    # Extract month from sampling date
+    df['month'] = df['SURVEY_DATE_dt'].dt.month
+
+    # Add seasonal indicators
+    seasons = {
+        'winter': [12, 1, 2],
+        'spring': [3, 4, 5], 
+        'summer': [6, 7, 8],
+        'fall': [9, 10, 11]
+    }
+
+    for season, months in seasons.items():
+        df[f'is_{season}'] = df['month'].isin(months).astype(int)
+
+    print("   ✅ Added seasonal features")
+
+    # --- 6. Save Final Dataset ---
+    print(f"5. Saving final dataset to {OUTPUT_PARQUET_PATH}...")
+    # Drop the temporary datetime, month and lookup key columns
+    df.drop(columns=['SURVEY_DATE_dt', 'month', '_key'], inplace=True)
+    os.makedirs('data/processed', exist_ok=True)
+    # Columnar zstd Parquet is far smaller and faster to load than CSV for the training stage
+    df.to_parquet(OUTPUT_PARQUET_PATH, engine='pyarrow', compression='zstd', compression_level=3, index=False)
+
+    # Print final summary
+    print(f"\n✅ Success! Final dataset with all features saved to {OUTPUT_PARQUET_PATH}")
+    print(f"   Final dataset shape: {df.shape}")
+    print(f"   Weather statistics:")
+    print(f"   - Temperature: {df['temperature_2m'].mean():.1f}°C ± {df['temperature_2m'].std():.1f}°C")
+    print(f"   - Precipitation: {df['precipitation'].mean():.1f}mm ± {df['precipitation'].std():.1f}mm")
+    print(f"   - Humidity: {df['relative_humidity_2m'].mean():.1f}% ± {df['relative_humidity_2m'].std():.1f}%")
+    print(f"   - Dew Point: {df['dew_point_2m'].mean():.1f}°C ± {df['dew_point_2m'].std():.1f}°C")
+    print("   Next step: Run `src/train_model.py`")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# Save this file as: src/common.py
+# Definitions shared by the pipeline scripts, so the stages cannot drift apart.
+
+import os
+import numpy as np
+
+# Columnar copy of the LUCAS CSV, written by data_acquisition.py and read by
+# add_raster_features.py
+LUCAS_PARQUET_PATH = 'data/external/LUCAS.parquet'
+
+# Band images inside an extracted .SAFE folder, and the file listing them that
+# data_acquisition.py writes next to them for add_raster_features.py
+JP2_PATTERN = 'GRANULE/*/IMG_DATA/R*m/*.jp2'
+MANIFEST_NAME = 'manifest.json'
+
+# Sentinel-2 bands and their 3x3 neighbour-pixel columns (e.g. B8A_5)
+SENTINEL_BANDS = ['B01', 'B02', 'B03', 'B04', 'B05', 'B06', 'B07', 'B08', 'B8A', 'B09', 'B10', 'B11', 'B12']
+SENTINEL_COLS = frozenset(f'{band}_{i}' for band in SENTINEL_BANDS for i in range(1, 10))
+
+def normalized_difference(df, band_a, band_b):
+    """(a - b) / (a + b) of two columns in float32, NaN where a + b == 0"""
+    a = df[band_a].to_numpy(dtype=np.float32, copy=False)
+    b = df[band_b].to_numpy(dtype=np.float32, copy=False)
+
+    vi = np.subtract(a, b)
+    denominator = a + b
+    zero = denominator == 0
+    np.divide(vi, denominator, out=vi, where=~zero)
+    vi[zero] = np.nan
+    return vi
+
+def is_fresh(cache_path, source_path):
+    """True if cache_path exists and is at least as new as source_path"""
+    if not os.path.exists(cache_path):
+        return False
+    return not os.path.exists(source_path) or os.path.getmtime(cache_path) >= os.path.getmtime(source_path)
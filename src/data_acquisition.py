@@ -1,10 +1,25 @@
 import os
+import numpy as np
 import pandas as pd
 import requests
 from datetime import date
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 import zipfile
-import io
+import mmap
+import json
+import shutil
+import tempfile
+from pathlib import PurePosixPath
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared pipeline definitions (relative import when run through the
+# orchestrator, plain import when the script is run directly)
+try:
+    from .common import JP2_PATTERN, LUCAS_PARQUET_PATH, MANIFEST_NAME, is_fresh
+except ImportError:
+    from common import JP2_PATTERN, LUCAS_PARQUET_PATH, MANIFEST_NAME, is_fresh
 
 # --- 0. Load Environment Variables ---
 load_dotenv()
@@ -17,6 +32,11 @@ CLIENT_SECRET = os.getenv('COPERNICUS_CLIENT_SECRET')
 AUTH_URL = "https://identity.dataspace.copernicus.eu/auth/realms/CDSE/protocol/openid-connect/token"
 CATALOG_URL = "https://catalogue.dataspace.copernicus.eu/odata/v1/Products"
 DOWNLOAD_URL_TEMPLATE = "https://zipper.dataspace.copernicus.eu/odata/v1/Products({})/$value"
+# Tried in order when the main download endpoint fails
+ALT_DOWNLOAD_URL_TEMPLATES = [
+    "https://catalogue.dataspace.copernicus.eu/odata/v1/Products({})/$value",
+    "https://download.dataspace.copernicus.eu/odata/v1/Products({})/$value"
+]
 
 # Project file paths
 LUCAS_FILE_PATH = 'data/external/LUCAS SOIL Modified.csv'
@@ -26,303 +46,395 @@ DOWNLOAD_DIR = 'data/raw/'
 DATE_RANGE = (date(2018, 5, 1), date(2018, 8, 31))
 CLOUD_COVER = 20  # Max cloud cover %
 
-# --- 2. Authenticate and Get Access Token ---
-print("1. Authenticating with Copernicus Data Space...")
-try:
-    auth_data = {
-        'client_id': CLIENT_ID,
-        'client_secret': CLIENT_SECRET,
-        'grant_type': 'client_credentials'
-    }
-    response = requests.post(AUTH_URL, data=auth_data)
-    response.raise_for_status()  # Raise an error for bad responses (4xx, 5xx)
-    access_token = response.json()['access_token']
-    print("   ✅ Authentication successful.")
-except Exception as e:
-    print(f"❌ FAILED to authenticate. Check COPERNICUS_CLIENT_ID and COPERNICUS_CLIENT_SECRET in .env file.")
-    print(f"   Error: {e}")
-    exit(1)
-
-auth_headers = {'Authorization': f'Bearer {access_token}'}
-
-# --- 3. Generate AOI from LUCAS File ---
-print(f"2. Reading LUCAS file to generate AOI: {LUCAS_FILE_PATH}")
-try:
-    df_lucas = pd.read_csv(LUCAS_FILE_PATH)
-except FileNotFoundError:
-    print(f"❌ Error: LUCAS file not found at {LUCAS_FILE_PATH}")
-    exit(1)
-
-# Find the bounding box
-min_lon = df_lucas['TH_LONG'].min() - 0.01
-max_lon = df_lucas['TH_LONG'].max() + 0.01
-min_lat = df_lucas['TH_LAT'].min() - 0.01
-max_lat = df_lucas['TH_LAT'].max() + 0.01
-
-# Create WKT (Well-Known Text) string for the bounding box
-AOI_WKT = f'POLYGON(({min_lon} {min_lat}, {max_lon} {min_lat}, {max_lon} {max_lat}, {min_lon} {max_lat}, {min_lon} {min_lat}))'
-print(f"   Generated Bounding Box (WGS84): {AOI_WKT}")
-
-# --- 4. Search for Products ---
-print(f"3. Querying for products...")
-start_date_str = DATE_RANGE[0].strftime('%Y-%m-%dT00:00:00.000Z')
-end_date_str = DATE_RANGE[1].strftime('%Y-%m-%dT23:59:59.000Z')
-
-# CORRECTED filter query - simplified approach
-filter_query = (
-    f"Collection/Name eq 'SENTINEL-2' "
-    f"and OData.CSC.Intersects(area=geography'SRID=4326;{AOI_WKT}') "
-    f"and ContentDate/Start ge {start_date_str} "
-    f"and ContentDate/Start le {end_date_str} "
-    f"and contains(Name,'MSIL2A')"
-)
-
-print(f"   Filter query: {filter_query}")
-
-# Construct the full API request
-search_params = {
-    '$filter': filter_query,
-    '$orderby': 'ContentDate/Start desc',
-    '$top': 10  # Get more results to choose from
-}
+# Download streaming: read 128 KiB at a time and report progress every
+# 64 chunks (8 MiB) instead of on every chunk
+DOWNLOAD_CHUNK_SIZE = 128 * 1024
+PROGRESS_EVERY_CHUNKS = 64
 
-try:
-    response = requests.get(CATALOG_URL, headers=auth_headers, params=search_params)
-    response.raise_for_status()
-    products = response.json().get('value', [])
-    print(f"   ✅ Found {len(products)} products")
-except Exception as e:
-    print(f"❌ FAILED to query products. Error: {e}")
-    if hasattr(e, 'response') and e.response is not None:
-        print(f"   Server Response: {e.response.text}")
-    exit(1)
-
-if not products:
-    print("🤷 No products found for the given criteria.")
-    exit()
-
-# Filter products by cloud cover manually (since the attribute filter might be causing issues)
-filtered_products = []
-for product in products:
-    # Try to get cloud cover information if available
-    cloud_cover = None
-    try:
-        # Get full product details to check cloud cover
-        product_details_url = f"{CATALOG_URL}('{product['Id']}')"
-        details_response = requests.get(product_details_url, headers=auth_headers)
-        if details_response.status_code == 200:
-            details = details_response.json()
-            # Look for cloud cover in attributes
-            for attr in details.get('Attributes', []):
-                if attr.get('Name') == 'cloudCover':
-                    cloud_cover = attr.get('Value')
-                    break
-    except:
-        pass
-    
-    # If we have cloud cover info, use it to filter
-    if cloud_cover is None or float(cloud_cover) <= CLOUD_COVER:
-        filtered_products.append({
-            'Id': product['Id'],
-            'Name': product['Name'],
-            'CloudCover': cloud_cover
-        })
-
-if not filtered_products:
-    print("🤷 No products found with cloud cover <= 20%.")
-    # Fall back to original products without cloud cover filtering
-    filtered_products = [{'Id': p['Id'], 'Name': p['Name'], 'CloudCover': 'Unknown'} for p in products[:1]]
-
-# Select the first product with lowest cloud cover
-product_to_download = filtered_products[0]
-product_name = product_to_download['Name']
-product_id = product_to_download['Id']
-cloud_cover_info = product_to_download['CloudCover']
-
-print(f"4. Selected product: {product_name}")
-print(f"   Cloud Cover: {cloud_cover_info}%")
-print(f"   Product ID: {product_id}")
-
-# --- 5. Download and Unzip Product ---
-print(f"5. ⬇️ Downloading product (this may take a while)...")
-os.makedirs(DOWNLOAD_DIR, exist_ok=True)
-
-# FIXED: Use the correct download endpoint format without quotes around product ID
-download_url = DOWNLOAD_URL_TEMPLATE.format(product_id)
-
-print(f"   Download URL: {download_url}")
+# Parallel Range download: ~16 MiB parts fetched by a few concurrent streams
+# (too many streams can hurt more than they help)
+RANGE_PART_SIZE = 16 * 1024 * 1024
+RANGE_WORKERS = 6
 
-try:
-    # First, check if we can access the download
-    head_response = requests.head(download_url, headers=auth_headers)
-    print(f"   Pre-flight check: {head_response.status_code}")
+# One pooled session serves auth, catalogue queries and every (parallel)
+# download request, so TCP+TLS connections are reused instead of
+# re-established per call. The pool must fit all Range workers.
+# Rate limiting and transient server errors are retried with exponential
+# backoff (0.5s, 1s, 2s) before a request is reported as failed.
+HTTP_POOL_SIZE = 16
+HTTP_RETRY = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE, max_retries=HTTP_RETRY))
+
+# --- Helper Functions ---
+class SeekableMmap(mmap.mmap):
+    """Read-only mmap that ZipFile can extract from (mmap only reports seekable() from Python 3.13)"""
+
+    def seekable(self):
+        return True
+
+def read_lucas_coords():
+    """
+    Read the LUCAS coordinates from the Parquet copy of the CSV. The first run
+    parses the CSV once and writes the copy, so later runs (and the raster
+    stage) only read two columns instead of tokenizing the whole file.
+    """
+    if not is_fresh(LUCAS_PARQUET_PATH, LUCAS_FILE_PATH):
+        print(f"   Caching LUCAS table as {LUCAS_PARQUET_PATH}")
+        # The unnamed first column is the saved row index, not data
+        df = pd.read_csv(LUCAS_FILE_PATH, engine='pyarrow', index_col=0)
+        # Write under a temporary name so a partial file is never picked up
+        tmp_path = LUCAS_PARQUET_PATH + '.tmp'
+        df.to_parquet(tmp_path, engine='pyarrow', compression='zstd', index=False)
+        os.replace(tmp_path, LUCAS_PARQUET_PATH)
+    return pd.read_parquet(LUCAS_PARQUET_PATH, engine='pyarrow', columns=['TH_LONG', 'TH_LAT'], memory_map=True)
+
+def save_stream(r, zip_path):
+    """Write the body of an open streamed response to zip_path"""
+    print(f"   Downloading to {zip_path}...")
+    total_size = int(r.headers.get('content-length', 0))
+    downloaded_size = 0
     
-    if head_response.status_code == 200:
-        print(f"   Download is accessible, starting download...")
-        
-        with requests.get(download_url, headers=auth_headers, stream=True) as r:
-            r.raise_for_status()
-            
-            # Check if the file already exists
-            zip_path = os.path.join(DOWNLOAD_DIR, f"{product_name}.zip")
-            if os.path.exists(zip_path):
-                print(f"   File {product_name}.zip already exists. Skipping download.")
-            else:
-                print(f"   Downloading to {zip_path}...")
-                total_size = int(r.headers.get('content-length', 0))
-                downloaded_size = 0
-                
-                with open(zip_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded_size += len(chunk)
-                            if total_size > 0:
-                                percent = (downloaded_size / total_size) * 100
-                                print(f"   Progress: {percent:.1f}%", end='\r')
-                
-                print(f"   ...Download complete. File size: {downloaded_size / (1024*1024):.2f} MB")
+    # Read straight from the urllib3 response (decoding any
+    # transfer compression) to skip iter_content's per-chunk overhead
+    r.raw.decode_content = True
+    with open(zip_path, 'wb') as f:
+        n_chunks = 0
+        while chunk := r.raw.read(DOWNLOAD_CHUNK_SIZE):
+            f.write(chunk)
+            downloaded_size += len(chunk)
+            n_chunks += 1
+            if total_size > 0 and n_chunks % PROGRESS_EVERY_CHUNKS == 0:
+                percent = (downloaded_size / total_size) * 100
+                print(f"   Progress: {percent:.1f}%", end='\r')
+    
+    print(f"   ...Download complete. File size: {downloaded_size / (1024*1024):.2f} MB")
+
+def download_stream(url, headers, zip_path):
+    """Download url to zip_path over a single streamed GET"""
+    with session.get(url, headers=headers, stream=True) as r:
+        r.raise_for_status()
+        save_stream(r, zip_path)
+
+def download_part(url, headers, zip_path, start, end):
+    """
+    Fetch bytes [start, end] of url into the same offsets of zip_path.
+    Returns False if the server ignored the Range header.
+    """
+    # Byte ranges refer to the encoded body, so ask for it unencoded
+    part_headers = {**headers, 'Range': f'bytes={start}-{end}', 'Accept-Encoding': 'identity'}
+    with session.get(url, headers=part_headers, stream=True) as r:
+        r.raise_for_status()
+        if r.status_code != 206:
+            return False
         
-        # Unzip the file
-        print(f"6. Unzipping file: {zip_path}")
+        # Each part writes through its own handle (os.pwrite is not portable)
+        with open(zip_path, 'r+b') as f:
+            f.seek(start)
+            while chunk := r.raw.read(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+    return True
+
+def download_ranges(url, headers, zip_path, total_size, start=0):
+    """
+    Download bytes [start, total_size) of url as parallel Range requests
+    into the already pre-sized zip_path.
+    Returns False if the server does not honour ranges.
+    """
+    parts = [(part_start, min(part_start + RANGE_PART_SIZE, total_size) - 1)
+             for part_start in range(start, total_size, RANGE_PART_SIZE)]
+    
+    done = 0
+    with ThreadPoolExecutor(max_workers=RANGE_WORKERS) as executor:
+        futures = [executor.submit(download_part, url, headers, zip_path, part_start, end) for part_start, end in parts]
         try:
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(DOWNLOAD_DIR)
-            
-            print(f"✅ Download and extraction complete in: {DOWNLOAD_DIR}")
-            print("\nNext step: Run `src/add_raster_features.py`")
-            
-        except zipfile.BadZipFile:
-            print(f"❌ Error: The downloaded file is not a valid ZIP file")
-            # Try to read the error message
-            try:
-                with open(zip_path, 'r', encoding='utf-8') as f:
-                    error_content = f.read()
-                    print(f"   Server response: {error_content}")
-            except:
-                print(f"   Could not read error response")
-            
-    else:
-        print(f"❌ Cannot access download. Status: {head_response.status_code}")
-        print(f"   Response headers: {head_response.headers}")
-        
-        # Try alternative download endpoints
-        print("   Trying alternative download endpoints...")
-        
-        # Alternative 1: Direct download from catalog
-        alt_download_url1 = f"https://catalogue.dataspace.copernicus.eu/odata/v1/Products({product_id})/$value"
-        print(f"   Trying alternative 1: {alt_download_url1}")
+            for future in futures:
+                if not future.result():
+                    return False
+                done += 1
+                print(f"   Progress: {done}/{len(parts)} parts", end='\r')
+        finally:
+            # If a part failed, drop the queued ones instead of downloading them for
+            # nothing, and wait for the running ones before the file is reused
+            executor.shutdown(cancel_futures=True)
+    
+    print(f"   ...Download complete. File size: {total_size / (1024*1024):.2f} MB")
+    return True
+
+def download_product(url, headers, zip_path):
+    """
+    Download url to zip_path without a HEAD pre-flight. The first GET asks
+    for the first part as a byte range: a 206 reply carries the total size
+    in Content-Range, and the remaining parts are then fetched in parallel.
+    A server that ignores ranges answers 200 with the whole body, which is
+    streamed as it is. Raises on HTTP errors.
+    """
+    first_headers = {**headers, 'Range': f'bytes=0-{RANGE_PART_SIZE - 1}', 'Accept-Encoding': 'identity'}
+    with session.get(url, headers=first_headers, stream=True) as r:
+        r.raise_for_status()
+        if r.status_code != 206:
+            # No range support: this response already is the whole file
+            save_stream(r, zip_path)
+            return
         
-        try:
-            with requests.get(alt_download_url1, headers=auth_headers, stream=True) as r:
-                r.raise_for_status()
-                zip_path = os.path.join(DOWNLOAD_DIR, f"{product_name}.zip")
-                
-                print(f"   Alternative download successful! Downloading...")
-                total_size = int(r.headers.get('content-length', 0))
-                downloaded_size = 0
-                
-                with open(zip_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded_size += len(chunk)
-                            if total_size > 0:
-                                percent = (downloaded_size / total_size) * 100
-                                print(f"   Progress: {percent:.1f}%", end='\r')
-                
-                print(f"   ...Alternative download complete. File size: {downloaded_size / (1024*1024):.2f} MB")
-                
-                # Unzip
-                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    zip_ref.extractall(DOWNLOAD_DIR)
-                
-                print(f"✅ Download and extraction complete in: {DOWNLOAD_DIR}")
-                print("\nNext step: Run `src/add_raster_features.py`")
-                
-        except Exception as alt_e:
-            print(f"❌ Alternative 1 failed: {alt_e}")
-            
-            # Alternative 2: Newer download endpoint
-            alt_download_url2 = f"https://download.dataspace.copernicus.eu/odata/v1/Products({product_id})/$value"
-            print(f"   Trying alternative 2: {alt_download_url2}")
-            
+        total = r.headers.get('content-range', '').rpartition('/')[2]
+        if total.isdigit():
+            total_size = int(total)
+            print(f"   Downloading to {zip_path} in parallel parts...")
+            with open(zip_path, 'wb') as f:
+                f.truncate(total_size)
+                while chunk := r.raw.read(DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+    
+    # Fall back to a single stream if the total size is unknown or a later
+    # part is not served as a range
+    if not (total.isdigit() and download_ranges(url, headers, zip_path, total_size, start=RANGE_PART_SIZE)):
+        download_stream(url, headers, zip_path)
+
+def print_response_head(path, n_bytes=512):
+    """Print the start of a downloaded file that turned out not to be a ZIP (usually a server error body)"""
+    with open(path, 'rb') as f:
+        head = f.read(n_bytes)
+    print(f"   Server response: {head.decode('utf-8', errors='replace')}")
+
+def write_jp2_manifest(zip_ref, out_dir):
+    """
+    Write <SAFE>/manifest.json listing the band JP2s (path relative to the
+    .SAFE folder and size in bytes) of an extracted product. The list comes
+    from the ZIP's central directory, so nothing is walked or stat'ed.
+    """
+    manifests = {}
+    for info in zip_ref.infolist():
+        safe_name, _, rel_path = info.filename.partition('/')
+        if safe_name.endswith('.SAFE') and PurePosixPath(rel_path).match(JP2_PATTERN):
+            manifests.setdefault(safe_name, []).append({'path': rel_path, 'size': info.file_size})
+    
+    for safe_name, jp2_files in manifests.items():
+        manifest_path = os.path.join(out_dir, safe_name, MANIFEST_NAME)
+        with open(manifest_path, 'w') as f:
+            json.dump({'jp2_files': jp2_files}, f, indent=2)
+        print(f"   Listed {len(jp2_files)} band images in {safe_name}/{MANIFEST_NAME}")
+
+def stream_and_extract(url, headers, out_dir, product_name):
+    """
+    Download a product zip into out_dir (once) and extract it there.
+    Large archives are fetched as parallel Range requests when the server
+    supports them, otherwise as a single stream. The archive is written to
+    disk a single time and then memory-mapped for extraction, so the OS page
+    cache rather than Python buffers feeds the decompression. Raises on HTTP
+    errors and zipfile.BadZipFile.
+    """
+    zip_path = os.path.join(out_dir, f"{product_name}.zip")
+    
+    if os.path.exists(zip_path):
+        print(f"   File {product_name}.zip already exists. Skipping download.")
+    else:
+        # Download under a temporary name so an interrupted run is not
+        # mistaken for a finished archive next time
+        part_path = zip_path + '.part'
+        download_product(url, headers, part_path)
+        os.replace(part_path, zip_path)
+    
+    print(f"6. Unzipping file: {zip_path}")
+    # Extract into a temporary folder next to the final location and move the
+    # result into place only once everything (manifest included) is written,
+    # so a failed extraction never leaves a partial .SAFE tree behind
+    tmp_dir = tempfile.mkdtemp(prefix='.extract-', dir=out_dir)
+    try:
+        if os.path.getsize(zip_path) == 0:
+            raise zipfile.BadZipFile("Downloaded file is empty")
+        with open(zip_path, 'rb') as f, SeekableMmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # Opening the archive only reads its central directory at the end of
+            # the file, so an error page or a truncated download is rejected
+            # before anything is extracted
             try:
-                with requests.get(alt_download_url2, headers=auth_headers, stream=True) as r:
-                    r.raise_for_status()
-                    zip_path = os.path.join(DOWNLOAD_DIR, f"{product_name}.zip")
-                    
-                    print(f"   Alternative download 2 successful! Downloading...")
-                    total_size = int(r.headers.get('content-length', 0))
-                    downloaded_size = 0
-                    
-                    with open(zip_path, 'wb') as f:
-                        for chunk in r.iter_content(chunk_size=8192):
-                            if chunk:
-                                f.write(chunk)
-                                downloaded_size += len(chunk)
-                                if total_size > 0:
-                                    percent = (downloaded_size / total_size) * 100
-                                    print(f"   Progress: {percent:.1f}%", end='\r')
-                    
-                    print(f"   ...Alternative download complete. File size: {downloaded_size / (1024*1024):.2f} MB")
-                    
-                    # Unzip
-                    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                        zip_ref.extractall(DOWNLOAD_DIR)
-                    
-                    print(f"✅ Download and extraction complete in: {DOWNLOAD_DIR}")
-                    print("\nNext step: Run `src/add_raster_features.py`")
-                    
-            except Exception as alt_e2:
-                print(f"❌ All download attempts failed:")
-                print(f"   Alternative 2 error: {alt_e2}")
-                print("   Please check:")
-                print("   - Your internet connection")
-                print("   - That the product is available for download")
-                print("   - Your account permissions")
-                exit(1)
-
-except requests.exceptions.HTTPError as e:
-    print(f"❌ HTTP Error during download: {e}")
-    if e.response.status_code == 422:
-        print("   This usually means the product format is not supported for direct download.")
-        print("   Trying alternative download approach...")
-        
-        # Alternative: Use the product download endpoint directly
-        alt_download_url = f"https://catalogue.dataspace.copernicus.eu/odata/v1/Products({product_id})/$value"
-        print(f"   Trying alternative URL: {alt_download_url}")
+                zip_ref = zipfile.ZipFile(mm)
+            except (zipfile.BadZipFile, ValueError) as e:
+                # (a body shorter than the end-of-archive record fails the mmap seek)
+                print_response_head(zip_path)
+                raise zipfile.BadZipFile(f"Not a ZIP file: {e}")
+            with zip_ref:
+                # Member data (and CRCs) is only checked while extracting
+                print(f"   Central directory OK ({len(zip_ref.namelist())} files)")
+                zip_ref.extractall(tmp_dir)
+                write_jp2_manifest(zip_ref, tmp_dir)
         
+        for name in os.listdir(tmp_dir):
+            target = os.path.join(out_dir, name)
+            if os.path.isdir(target):
+                shutil.rmtree(target)
+            os.replace(os.path.join(tmp_dir, name), target)
+    except zipfile.BadZipFile:
+        # Remove it so the next attempt downloads it again instead of skipping
+        os.remove(zip_path)
+        raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    
+    print(f"✅ Download and extraction complete in: {out_dir}")
+    print("\nNext step: Run `src/add_raster_features.py`")
+    return zip_path
+
+def download_with_fallback(urls, headers, out_dir, product_name):
+    """
+    Download and extract the product from the first of urls that works.
+    Transient errors are already retried by the session, so a URL that
+    still fails is given up in favour of the next one. Raises the last
+    error if every URL fails.
+    """
+    last_error = None
+    for n, url in enumerate(urls, start=1):
+        print(f"   Trying endpoint {n}/{len(urls)}: {url}")
         try:
-            with requests.get(alt_download_url, headers=auth_headers, stream=True) as r:
-                r.raise_for_status()
-                zip_path = os.path.join(DOWNLOAD_DIR, f"{product_name}.zip")
-                
-                print(f"   Alternative download successful! Downloading...")
-                total_size = int(r.headers.get('content-length', 0))
-                downloaded_size = 0
-                
-                with open(zip_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded_size += len(chunk)
-                            if total_size > 0:
-                                percent = (downloaded_size / total_size) * 100
-                                print(f"   Progress: {percent:.1f}%", end='\r')
-                
-                print(f"   ...Alternative download complete. File size: {downloaded_size / (1024*1024):.2f} MB")
-                
-                # Unzip
-                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    zip_ref.extractall(DOWNLOAD_DIR)
-                
-                print(f"✅ Download and extraction complete in: {DOWNLOAD_DIR}")
-                print("\nNext step: Run `src/add_raster_features.py`")
-                
-        except Exception as alt_e:
-            print(f"❌ Alternative download also failed: {alt_e}")
-
-except Exception as e:
-    print(f"❌ FAILED during download or unzip: {e}")
-    exit(1)
\ No newline at end of file
+            return stream_and_extract(url, headers, out_dir, product_name)
+        except Exception as e:
+            print(f"❌ Endpoint {n} failed: {e}")
+            if isinstance(e, requests.exceptions.HTTPError) and e.response.status_code == 422:
+                print("   This usually means the product format is not supported for direct download.")
+            last_error = e
+    raise last_error
+
+def main():
+    """Find the least cloudy Sentinel-2 product over the LUCAS points, then download and unzip it"""
+    # --- 2. Authenticate and Get Access Token ---
+    print("1. Authenticating with Copernicus Data Space...")
+    try:
+        auth_data = {
+            'client_id': CLIENT_ID,
+            'client_secret': CLIENT_SECRET,
+            'grant_type': 'client_credentials'
+        }
+        response = session.post(AUTH_URL, data=auth_data)
+        response.raise_for_status()  # Raise an error for bad responses (4xx, 5xx)
+        access_token = response.json()['access_token']
+        print("   ✅ Authentication successful.")
+    except Exception as e:
+        print(f"❌ FAILED to authenticate. Check COPERNICUS_CLIENT_ID and COPERNICUS_CLIENT_SECRET in .env file.")
+        print(f"   Error: {e}")
+        exit(1)
+
+    auth_headers = {'Authorization': f'Bearer {access_token}'}
+    session.headers.update(auth_headers)
+
+    # --- 3. Generate AOI from LUCAS File ---
+    print(f"2. Reading LUCAS file to generate AOI: {LUCAS_FILE_PATH}")
+    try:
+        # Only the coordinates are needed for the AOI
+        df_lucas = read_lucas_coords()
+    except FileNotFoundError:
+        print(f"❌ Error: LUCAS file not found at {LUCAS_FILE_PATH}")
+        exit(1)
+
+    # Find the bounding box (one min and one max reduction over both columns)
+    coords = df_lucas[['TH_LONG', 'TH_LAT']].to_numpy(dtype=np.float64, copy=False)
+    min_lon, min_lat = np.nanmin(coords, axis=0) - 0.01
+    max_lon, max_lat = np.nanmax(coords, axis=0) + 0.01
+
+    # Create WKT (Well-Known Text) string for the bounding box
+    AOI_WKT = f'POLYGON(({min_lon} {min_lat}, {max_lon} {min_lat}, {max_lon} {max_lat}, {min_lon} {max_lat}, {min_lon} {min_lat}))'
+    print(f"   Generated Bounding Box (WGS84): {AOI_WKT}")
+
+    # --- 4. Search for Products ---
+    print(f"3. Querying for products...")
+    start_date_str = DATE_RANGE[0].strftime('%Y-%m-%dT00:00:00.000Z')
+    end_date_str = DATE_RANGE[1].strftime('%Y-%m-%dT23:59:59.000Z')
+
+    # CORRECTED filter query - simplified approach
+    filter_query = (
+        f"Collection/Name eq 'SENTINEL-2' "
+        f"and OData.CSC.Intersects(area=geography'SRID=4326;{AOI_WKT}') "
+        f"and ContentDate/Start ge {start_date_str} "
+        f"and ContentDate/Start le {end_date_str} "
+        f"and contains(Name,'MSIL2A')"
+    )
+
+    print(f"   Filter query: {filter_query}")
+
+    # Construct the full API request
+    search_params = {
+        '$filter': filter_query,
+        '$orderby': 'ContentDate/Start desc',
+        '$top': 10,  # Get more results to choose from
+        '$expand': 'Attributes'  # Include cloud cover etc. in the search response
+    }
+
+    try:
+        response = session.get(CATALOG_URL, headers=auth_headers, params=search_params)
+        response.raise_for_status()
+        products = response.json().get('value', [])
+        print(f"   ✅ Found {len(products)} products")
+    except Exception as e:
+        print(f"❌ FAILED to query products. Error: {e}")
+        if hasattr(e, 'response') and e.response is not None:
+            print(f"   Server Response: {e.response.text}")
+        exit(1)
+
+    if not products:
+        print("🤷 No products found for the given criteria.")
+        return
+
+    # Filter products by cloud cover manually (since the attribute filter might be causing issues).
+    # Attributes were expanded in the search itself, so no per-product requests are needed.
+    filtered_products = []
+    for product in products:
+        cloud_cover = None
+        for attr in product.get('Attributes', []):
+            if attr.get('Name') == 'cloudCover':
+                cloud_cover = attr.get('Value')
+                break
+    
+        # If we have cloud cover info, use it to filter
+        if cloud_cover is None or float(cloud_cover) <= CLOUD_COVER:
+            filtered_products.append({
+                'Id': product['Id'],
+                'Name': product['Name'],
+                'CloudCover': cloud_cover
+            })
+
+    # Lowest cloud cover first, products without cloud cover info last
+    # (stable sort, so ties keep the most recent product first)
+    filtered_products.sort(key=lambda p: float('inf') if p['CloudCover'] is None else float(p['CloudCover']))
+
+    if not filtered_products:
+        print("🤷 No products found with cloud cover <= 20%.")
+        # Fall back to original products without cloud cover filtering
+        filtered_products = [{'Id': p['Id'], 'Name': p['Name'], 'CloudCover': 'Unknown'} for p in products[:1]]
+
+    # Select the first product with lowest cloud cover
+    product_to_download = filtered_products[0]
+    product_name = product_to_download['Name']
+    product_id = product_to_download['Id']
+    cloud_cover_info = product_to_download['CloudCover']
+
+    print(f"4. Selected product: {product_name}")
+    print(f"   Cloud Cover: {cloud_cover_info}%")
+    print(f"   Product ID: {product_id}")
+
+    # --- 5. Download and Unzip Product ---
+    print(f"5. ⬇️ Downloading product (this may take a while)...")
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+
+    # FIXED: Use the correct download endpoint format without quotes around product ID
+    download_url = DOWNLOAD_URL_TEMPLATE.format(product_id)
+
+    print(f"   Download URL: {download_url}")
+
+    # Primary endpoint first, then the alternative endpoints. There is no
+    # pre-flight request: each download GET's own status decides whether the
+    # next endpoint is tried.
+    candidate_urls = [download_url] + [template.format(product_id) for template in ALT_DOWNLOAD_URL_TEMPLATES]
+
+    try:
+        download_with_fallback(candidate_urls, auth_headers, DOWNLOAD_DIR, product_name)
+    except Exception as e:
+        print(f"❌ All download attempts failed:")
+        print(f"   Last error: {e}")
+        print("   Please check:")
+        print("   - Your internet connection")
+        print("   - That the product is available for download")
+        print("   - Your account permissions")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,70 @@
 # Save this file as: src/orchestrator.py
 
-import subprocess
+import importlib
 import sys
 import os
+import traceback
 
 # --- 1. Define the Pipeline ---
-# List of scripts to run in the exact order of execution.
-# Paths are relative to the *root* of your project directory.
+# Modules to run in the exact order of execution. Every stage exposes a
+# main() and is run inside this interpreter, so pandas, numpy, rasterio etc.
+# are imported once for the whole pipeline instead of once per stage.
 SCRIPT_PIPELINE = [
-    'src/data_acquisition.py',
-    'src/add_raster_features.py',
-    'src/add_weather_features.py',
-    'src/train_model.py'
+    'src.data_acquisition',
+    'src.add_raster_features',
+    'src.add_weather_features',
+    'src.train_model'
 ]
 
-def run_script(script_path):
+def run_stage(module_name):
     """
-    Executes a Python script as a subprocess.
-    Uses the same Python executable that is running this orchestrator.
+    Imports a pipeline stage and runs its main() in this process.
+    Returns True if it finished successfully.
     """
-    print(f"\n--- 🚀 Starting: {script_path} ---")
-    
-    # Use sys.executable to ensure we use the same Python interpreter
-    command = [sys.executable, script_path]
-    
+    print(f"\n--- 🚀 Running: {module_name} ---")
     try:
-        # Execute the script
-        # check=True: Raises an error if the script returns a non-zero exit code
-        # text=True: Decodes stdout/stderr as text (requires Python 3.7+)
-        subprocess.run(command, check=True, text=True)
-        
-        print(f"--- ✅ Finished: {script_path} ---")
-        return True
-        
-    except FileNotFoundError:
-        print(f"--- ❌ FAILED: Script not found at {script_path} ---")
-        return False
-    except subprocess.CalledProcessError as e:
-        print(f"--- ❌ FAILED: {script_path} ---")
-        print(f"   An error occurred. Return code: {e.returncode}")
-        # Optionally print stdout/stderr from the failed script
-        # print(f"   STDOUT: {e.stdout}")
-        # print(f"   STDERR: {e.stderr}")
-        return False
+        importlib.import_module(module_name).main()
+    except SystemExit as e:
+        # Stages exit(1) on errors; a bare exit() just ends the stage early
+        if e.code not in (None, 0):
+            print(f"--- ❌ FAILED: {module_name} ---")
+            print(f"   An error occurred. Exit code: {e.code}")
+            return False
     except Exception as e:
-        print(f"--- ❌ FAILED: An unexpected error occurred with {script_path} ---")
+        print(f"--- ❌ FAILED: An unexpected error occurred with {module_name} ---")
         print(f"   Error: {e}")
+        traceback.print_exc()
         return False
 
+    print(f"--- ✅ Finished: {module_name} ---")
+    return True
+
 def main():
     """
     Runs the full data processing and modeling pipeline.
     """
     print("===  orchestrator.py: Starting the NPK Prediction Pipeline ===")
-    
+
     # Get the directory of this orchestrator script
     # and go one level up to get the project root.
     project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    
+
     # Change the current working directory to the project root
     # This ensures all relative paths (e.g., 'data/raw/') in your
     # scripts work correctly.
     os.chdir(project_root)
     print(f"Working Directory set to: {os.getcwd()}")
-    
-    for script_path in SCRIPT_PIPELINE:
-        if not run_script(script_path):
-            print(f"\n=== 🛑 Pipeline HALTED at {script_path} ===")
+
+    # Make the `src` package importable when run as `python src/orchestrator.py`
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+
+    for module_name in SCRIPT_PIPELINE:
+        if not run_stage(module_name):
+            print(f"\n=== 🛑 Pipeline HALTED at {module_name} ===")
             sys.exit(1) # Exit with an error code to signal failure
-            
+
     print("\n=== 🎉 Pipeline Completed Successfully ===")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()